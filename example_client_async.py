@@ -42,7 +42,7 @@ def main():
         # task.extend([make_list() for i in range(100)])
         # task.extend([make_dict() for i in range(100)])
         # task.extend([catch_exception() for i in range(100)])
-        await asyncio.wait(task)
+        await asyncio.gather(*task)
 
     loop = asyncio.get_event_loop()
     loop.run_until_complete(func())
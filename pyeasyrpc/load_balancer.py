@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""----------------------------------------------------------------------------
+Author:
+    Huang Quanyong (wo1fSea)
+    quanyongh@foxmail.com
+Date:
+    2019/8/26
+Description:
+    load_balancer.py
+----------------------------------------------------------------------------"""
+
+import random
+import threading
+import collections
+
+LOAD_BALANCER_ROUND_ROBIN = "round_robin"
+LOAD_BALANCER_RANDOM = "random"
+LOAD_BALANCER_LEAST_OUTSTANDING = "least_outstanding"
+LOAD_BALANCER_POWER_OF_TWO_CHOICES = "power_of_two_choices"
+
+
+class LoadBalancer(object):
+    """
+    select a service instance for every call of a client.
+
+    the outstanding request number of every service instance is counted
+    with begin and end, so it is only about the calls of one client.
+    """
+
+    def __init__(self):
+        super(LoadBalancer, self).__init__()
+        self._outstanding = collections.Counter()
+        self._lock = threading.Lock()
+
+    def select(self, service_uuids):
+        """
+        :param service_uuids: alive service uuids, not empty
+        :return: service_uuid
+        """
+        raise NotImplementedError()
+
+    def begin(self, service_uuid):
+        with self._lock:
+            self._outstanding[service_uuid] += 1
+
+    def end(self, service_uuid):
+        with self._lock:
+            self._outstanding[service_uuid] -= 1
+            if self._outstanding[service_uuid] <= 0:
+                del self._outstanding[service_uuid]
+
+    def get_outstanding(self, service_uuid):
+        return self._outstanding.get(service_uuid, 0)
+
+
+class RoundRobinLoadBalancer(LoadBalancer):
+    def __init__(self):
+        super(RoundRobinLoadBalancer, self).__init__()
+        self._index = 0
+        self._service_uuids = None
+        self._sorted_service_uuids = None
+
+    def select(self, service_uuids):
+        with self._lock:
+            # the alive service uuid set is cached by the rpc manager, sort it only if it changes
+            if service_uuids is not self._service_uuids:
+                self._service_uuids = service_uuids
+                self._sorted_service_uuids = sorted(service_uuids)
+
+            self._index += 1
+            return self._sorted_service_uuids[self._index % len(self._sorted_service_uuids)]
+
+
+class RandomLoadBalancer(LoadBalancer):
+    def select(self, service_uuids):
+        return random.choice(tuple(service_uuids))
+
+
+class LeastOutstandingLoadBalancer(LoadBalancer):
+    def select(self, service_uuids):
+        service_uuids = tuple(service_uuids)
+        least = min(map(self.get_outstanding, service_uuids))
+        return random.choice([x for x in service_uuids if self.get_outstanding(x) == least])
+
+
+class PowerOfTwoChoicesLoadBalancer(LoadBalancer):
+    def select(self, service_uuids):
+        service_uuids = tuple(service_uuids)
+        if len(service_uuids) < 2:
+            return service_uuids[0]
+
+        service_uuid0, service_uuid1 = random.sample(service_uuids, 2)
+        if self.get_outstanding(service_uuid1) < self.get_outstanding(service_uuid0):
+            return service_uuid1
+        return service_uuid0
+
+
+LOAD_BALANCERS = {
+    LOAD_BALANCER_ROUND_ROBIN: RoundRobinLoadBalancer,
+    LOAD_BALANCER_RANDOM: RandomLoadBalancer,
+    LOAD_BALANCER_LEAST_OUTSTANDING: LeastOutstandingLoadBalancer,
+    LOAD_BALANCER_POWER_OF_TWO_CHOICES: PowerOfTwoChoicesLoadBalancer,
+}
+
+
+def get_load_balancer(load_balancer):
+    """
+    :param load_balancer: name in LOAD_BALANCERS or a LoadBalancer
+    :return: LoadBalancer
+    """
+    if isinstance(load_balancer, LoadBalancer):
+        return load_balancer
+
+    if load_balancer not in LOAD_BALANCERS:
+        raise ValueError("unknown load balancer {load_balancer}.".format(load_balancer=load_balancer))
+
+    return LOAD_BALANCERS[load_balancer]()
@@ -91,3 +91,11 @@ class Dict(RedisObject, UserDict):
             self._redis.hincrbyfloat(self.key, self.pack(key), value)
         else:
             raise TypeError()
+
+    async def async_increase_by(self, key, value):
+        if isinstance(value, int):
+            await self._async_redis.hincrby(self.key, self.pack(key), value)
+        elif isinstance(value, float):
+            await self._async_redis.hincrbyfloat(self.key, self.pack(key), value)
+        else:
+            raise TypeError()
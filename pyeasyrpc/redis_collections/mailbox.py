@@ -23,6 +23,7 @@ class Mailbox(object):
         self._msg_handler = msg_handler
         self._channel = channel
         self._packer = packer
+        self._url = url
         self._redis = redis_connection.get_redis(url)
         self._pubsub = None
         self._thread = None
@@ -31,6 +32,10 @@ class Mailbox(object):
     def channel(self):
         return self._channel
 
+    @property
+    def packer(self):
+        return self._packer
+
     def _raw_handler(self, raw_data):
         if raw_data["type"] in ("psubscribe", "subscribe"):
             return
@@ -54,6 +59,21 @@ class Mailbox(object):
     def set_message(self, data):
         self._redis.publish(self._channel, self._packer.pack(data))
 
+    def set_messages(self, data_list):
+        """
+        publish many messages in one round trip.
+        """
+        if not data_list:
+            return
+
+        pipeline = self._redis.pipeline(transaction=False)
+        for data in data_list:
+            pipeline.publish(self._channel, self._packer.pack(data))
+        pipeline.execute()
+
+    async def async_set_message(self, data):
+        await redis_connection.get_async_redis(self._url).publish(self._channel, self._packer.pack(data))
+
     def get_message(self, timeout=0):
         assert self._pubsub, "need subscribe before get_message"
 
@@ -66,9 +86,13 @@ class Mailbox(object):
         else:
             return data
 
-    def run_in_background(self):
+    def run_in_background(self, sleep_time=0., daemon=False):
+        """
+        :param sleep_time: seconds the background thread waits for a message in each loop
+        :param daemon: run as a daemon thread
+        """
         assert self._msg_handler, "msg_handler must be set before run_in_background"
-        self._thread = self._pubsub.run_in_thread()
+        self._thread = self._pubsub.run_in_thread(sleep_time=sleep_time, daemon=daemon)
 
     def stop_background_thread(self):
         if not self._thread:
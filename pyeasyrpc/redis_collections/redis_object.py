@@ -95,8 +95,13 @@ class RedisObject(object):
 
         self._key = key
         self._packer = packer
+        self._url = url
         self._redis = redis_connection.get_redis(url)
 
+    @property
+    def _async_redis(self):
+        return redis_connection.get_async_redis(self._url)
+
     def get_type(self):
         return self._redis.type(self._key).decode()
 
@@ -107,6 +112,9 @@ class RedisObject(object):
     def exists(self):
         return self._redis.exists(self._key)
 
+    async def async_exists(self):
+        return await self._async_redis.exists(self._key)
+
     @property
     def key(self):
         return self._key
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""----------------------------------------------------------------------------
+Author:
+    Huang Quanyong (wo1fSea)
+    quanyongh@foxmail.com
+Date:
+    2019/8/20
+Description:
+    stream.py
+----------------------------------------------------------------------------"""
+
+import redis
+
+from .redis_object import RedisObject
+
+STREAM_MAX_LENGTH = -1
+STREAM_DATA_FIELD = b"data"
+
+
+class Stream(RedisObject):
+    """
+    a redis stream consumed by a consumer group.
+
+    every consumer of the same group receives a different entry, entries
+    stay pending until they are acknowledged and can be claimed by another
+    consumer if their owner dies.
+    """
+    Redis_Type = "stream"
+
+    def __init__(self, key, group_name, consumer_name=None, max_len=STREAM_MAX_LENGTH, packer=None, url=None):
+        super(Stream, self).__init__(key, packer, url)
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.max_len = max_len
+
+    def __len__(self):
+        return self._redis.xlen(self.key)
+
+    def create_group(self):
+        """
+        create the consumer group (and the stream) if not exist.
+        """
+        try:
+            self._redis.xgroup_create(self.key, self.group_name, id="0", mkstream=True)
+        except redis.ResponseError as ex:
+            if "BUSYGROUP" not in str(ex):
+                raise
+
+    def _add_args(self):
+        if self.max_len > 0:
+            return {"maxlen": self.max_len, "approximate": True}
+        return {}
+
+    def add(self, item):
+        return self._redis.xadd(self.key, {STREAM_DATA_FIELD: self.pack(item)}, **self._add_args())
+
+    async def async_add(self, item):
+        return await self._async_redis.xadd(self.key, {STREAM_DATA_FIELD: self.pack(item)}, **self._add_args())
+
+    def add_many(self, items):
+        if not items:
+            return []
+
+        pipeline = self._redis.pipeline(transaction=False)
+        for item in items:
+            pipeline.xadd(self.key, {STREAM_DATA_FIELD: self.pack(item)}, **self._add_args())
+        return pipeline.execute()
+
+    def _unpack_entries(self, entries):
+        return [(entry_id, self.unpack(fields[STREAM_DATA_FIELD])) for entry_id, fields in entries if fields]
+
+    def read_group(self, count=1, block=None):
+        """
+        read new entries for this consumer.
+        :param count: max entry number to read
+        :param block: milliseconds to block, None for no blocking
+        :return: [(entry_id, item), ...]
+        """
+        assert self.consumer_name, "consumer_name must be set before read_group"
+
+        result = self._redis.xreadgroup(
+            self.group_name,
+            self.consumer_name,
+            {self.key: ">"},
+            count=count,
+            block=block
+        )
+        if not result:
+            return []
+
+        return self._unpack_entries(result[0][1])
+
+    async def async_read_group(self, count=1, block=None):
+        assert self.consumer_name, "consumer_name must be set before read_group"
+
+        result = await self._async_redis.xreadgroup(
+            self.group_name,
+            self.consumer_name,
+            {self.key: ">"},
+            count=count,
+            block=block
+        )
+        if not result:
+            return []
+
+        return self._unpack_entries(result[0][1])
+
+    def ack(self, *entry_ids):
+        if entry_ids:
+            self._redis.xack(self.key, self.group_name, *entry_ids)
+
+    async def async_ack(self, *entry_ids):
+        if entry_ids:
+            await self._async_redis.xack(self.key, self.group_name, *entry_ids)
+
+    def claim_stale(self, min_idle_time, count=100):
+        """
+        claim entries pending longer than min_idle_time from any consumer of the group.
+        :param min_idle_time: milliseconds
+        :param count: max entry number to claim
+        :return: [(entry_id, item), ...]
+        """
+        assert self.consumer_name, "consumer_name must be set before claim_stale"
+
+        result = self._redis.xautoclaim(
+            self.key,
+            self.group_name,
+            self.consumer_name,
+            int(min_idle_time),
+            start_id="0-0",
+            count=count
+        )
+        return self._unpack_entries(result[1])
@@ -10,11 +10,16 @@ Description:
 ----------------------------------------------------------------------------"""
 
 import time
+import weakref
+import asyncio
 import redis
+import redis.asyncio
 
 DEFAULT_URL = "redis://localhost:6379/0"
 DELTA_TIME = {}
 REDIS_POOLS = {}
+ASYNC_REDIS_POOLS = weakref.WeakKeyDictionary()
+ASYNC_REDIS_MAX_CONNECTIONS = 64
 
 
 def get_redis(url=None):
@@ -27,6 +32,25 @@ def get_redis(url=None):
     return redis_
 
 
+def get_async_redis(url=None):
+    """
+    get a redis.asyncio client, must be called in a running event loop
+    since the connections of the client are bound to the loop.
+    """
+    if not url:
+        url = DEFAULT_URL
+    redis_pools = ASYNC_REDIS_POOLS.setdefault(asyncio.get_running_loop(), {})
+    redis_ = redis_pools.get(url)
+    if not redis_:
+        connection_pool = redis.asyncio.BlockingConnectionPool.from_url(
+            url,
+            max_connections=ASYNC_REDIS_MAX_CONNECTIONS
+        )
+        redis_ = redis.asyncio.Redis(connection_pool=connection_pool)
+        redis_pools[url] = redis_
+    return redis_
+
+
 def get_time(url=None):
     if not url:
         url = DEFAULT_URL
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""----------------------------------------------------------------------------
+Author:
+    Huang Quanyong (wo1fSea)
+    quanyongh@foxmail.com
+Date:
+    2019/8/24
+Description:
+    return_dispatcher.py
+----------------------------------------------------------------------------"""
+
+import time
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+
+class ReturnDispatcher(object):
+    """
+    read returns from a mailbox in a background thread and dispatch them to
+    the futures of the calls by rpc_uuid, so many threads can share a client.
+
+    a future is resolved with the return rpc_data, or with None if no return
+    arrives before its expire_time. a future is kept until it is discarded by
+    the caller or expires, returns of unknown calls are dropped. a discarded
+    future which is not resolved is cancelled.
+    """
+
+    READ_TIMEOUT = 0.5  # s
+    EXPIRE_CHECK_INTERVAL = 1.000  # s
+
+    def __init__(self, mailbox, rpc_manager):
+        super(ReturnDispatcher, self).__init__()
+        self._mailbox = mailbox
+        self._rpc_manager = rpc_manager
+
+        self._futures = {}
+        self._lock = threading.Lock()
+
+        self._is_thread_running = False
+        self._thread = None
+        self._last_expire_check_time = 0.
+
+    @property
+    def is_running(self):
+        return self._is_thread_running
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            # subscribe before any request is sent, or the return may be missed.
+            self._mailbox.subscribe()
+
+            self._is_thread_running = True
+            self._thread = threading.Thread(target=self._dispatch_in_thread, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._is_thread_running = False
+            self._thread = None
+
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def register(self, rpc_uuid, expire_time):
+        """
+        register a call before its request is sent.
+        :return: future of the return rpc_data
+        """
+        self.start()
+
+        future = Future()
+        with self._lock:
+            self._futures[rpc_uuid] = (future, expire_time)
+        return future
+
+    def get_future(self, rpc_uuid):
+        with self._lock:
+            registered = self._futures.get(rpc_uuid)
+        return registered[0] if registered else None
+
+    def discard(self, rpc_uuid):
+        with self._lock:
+            registered = self._futures.pop(rpc_uuid, None)
+
+        if registered:
+            registered[0].cancel()
+
+    def __len__(self):
+        return len(self._futures)
+
+    def dispatch(self, rpc_data):
+        with self._lock:
+            registered = self._futures.get(rpc_data.get("rpc_uuid"))
+
+        if registered:
+            self._resolve(registered[0], rpc_data)
+
+    def expire(self):
+        """
+        remove the futures whose calls expire, resolve them with None if no return arrives.
+        """
+        now = self._rpc_manager.time
+        with self._lock:
+            expired = [rpc_uuid for rpc_uuid, (_, expire_time) in self._futures.items() if expire_time < now]
+            expired = [self._futures.pop(rpc_uuid)[0] for rpc_uuid in expired]
+            self._last_expire_check_time = now
+
+        for future in expired:
+            self._resolve(future, None)
+
+    @staticmethod
+    def _resolve(future, rpc_data):
+        try:
+            future.set_result(rpc_data)
+        except InvalidStateError:
+            # resolved or cancelled by discard in another thread
+            pass
+
+    def _dispatch_in_thread(self):
+        while self._is_thread_running:
+            try:
+                rpc_data = self._mailbox.get_message(self.READ_TIMEOUT)
+            except Exception as ex:
+                # TODO: do log
+                # pubsub connects and subscribes again on the next read.
+                print("ReturnDispatcher Exception:", ex)
+                time.sleep(self.READ_TIMEOUT)
+                continue
+
+            if rpc_data:
+                self.dispatch(rpc_data)
+
+            if self._rpc_manager.time - self._last_expire_check_time > self.EXPIRE_CHECK_INTERVAL:
+                self.expire()
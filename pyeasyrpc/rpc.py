@@ -13,38 +13,106 @@ import inspect
 import time
 import threading
 import asyncio
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
+from . import redis_connection
 from .rpc_manager import DefaultRPCManager
+from .rpc_data import TRANSPORT_PUBSUB, TRANSPORT_STREAM
+from .return_dispatcher import ReturnDispatcher
+from .load_balancer import get_load_balancer, LOAD_BALANCER_POWER_OF_TWO_CHOICES
 from .redis_collections.mailbox import Mailbox
 
 
-def remote_method(method):
+class RPCServiceBusyError(Exception):
+    """
+    raised when a service has too many pending requests to accept a new one.
+    """
+
+
+def remote_method(method=None, **options):
+    """
+    mark a method of RPCService as remote method, used as @remote_method or @remote_method(**options).
+    :param options:
+        cpu_bound: run the method in the process pool of the service if the service has one,
+            the method is called with the service class instead of the service instance.
+    """
     frame = inspect.currentframe()
     # class_name = frame.f_back.f_code.co_names
-    method_name = method.__code__.co_name
-    rpc_methods = frame.f_back.f_locals.setdefault("rpc_methods", [])
-    rpc_methods.append(method_name)
+    class_locals = frame.f_back.f_locals
+
+    def decorator(method_):
+        method_name = method_.__code__.co_name
+        rpc_methods = class_locals.setdefault("rpc_methods", [])
+        rpc_methods.append(method_name)
+        rpc_method_options = class_locals.setdefault("rpc_method_options", {})
+        rpc_method_options[method_name] = options
+
+        return method_
+
+    if method is None:
+        return decorator
+    return decorator(method)
+
 
-    return method
+def _call_remote_method_in_process(service_class, method_name, args, kwargs):
+    method = getattr(service_class, method_name)
+    return method(service_class, *args, **kwargs)
 
 
 class RPCService(object):
     rpc_methods = []
+    rpc_method_options = {}
     CHECK_REQUEST_INTERVAL = 0.01  # s
+    BLOCKING_DISPATCH_TIMEOUT = 0.5  # s
+    STREAM_READ_COUNT = 16
+    STREAM_CLAIM_INTERVAL = 3.000  # s
 
     def __init__(self,
                  service_name="",
                  enable_multi_instance=True,
                  process_request_in_thread=False,
-                 rpc_manager=None
+                 rpc_manager=None,
+                 transport=TRANSPORT_PUBSUB,
+                 blocking_dispatch=False,
+                 max_workers=None,
+                 max_process_workers=0,
+                 max_pending_requests=0
                  ):
+        """
+        :param transport: TRANSPORT_PUBSUB delivers requests to the subscribed instance only,
+            TRANSPORT_STREAM delivers requests through a stream shared by every instance of the service
+            with a consumer group, requests are acknowledged after the return is sent.
+        :param blocking_dispatch: the process thread waits on the redis connection for the next request
+            instead of polling it every CHECK_REQUEST_INTERVAL.
+        :param max_workers: size of the thread pool processing requests if process_request_in_thread,
+            None for the default size of ThreadPoolExecutor.
+        :param max_process_workers: size of the process pool running cpu_bound remote methods,
+            0 for no process pool.
+        :param max_pending_requests: requests are rejected with RPCServiceBusyError once this number of
+            requests are queued or running in the thread pool, 0 for no limit.
+        """
         self._rpc_manager = DefaultRPCManager() if not rpc_manager else rpc_manager
         self._service_name = service_name
         self._service_uuid = None
+        self._transport = transport
         self._request_mailbox = None
+        self._request_stream = None
+        self._stream_entries = deque()
+        self._processing_stream_entry_ids = set()
+        self._last_stream_claim_time = 0.
         self._remote_methods = {}
         self._enable_multi_instance = enable_multi_instance
         self._process_request_in_thread = process_request_in_thread
+        self._blocking_dispatch = blocking_dispatch
+
+        self._thread_executor = ThreadPoolExecutor(max_workers) if process_request_in_thread else None
+        self._process_executor = ProcessPoolExecutor(max_process_workers) if max_process_workers > 0 else None
+        self._max_pending_requests = max_pending_requests
+        self._pending_request_count = 0
+        self._pending_request_lock = threading.Lock()
 
         for name in self.rpc_methods:
             method = getattr(self, name)
@@ -62,21 +130,37 @@ class RPCService(object):
         self._service_uuid = self._rpc_manager.register_service(
             self.service_name,
             self.rpc_methods,
-            self.enable_multi_instance
+            self.enable_multi_instance,
+            self.transport
         )
-        self._request_mailbox = Mailbox(
-            self._rpc_manager.get_service_instance_mailbox_channel(
+        self._open_request_channel()
+
+    def _open_request_channel(self):
+        if self.transport == TRANSPORT_STREAM:
+            self._request_stream = self._rpc_manager.get_service_request_stream(
                 self.service_name,
                 self.service_uuid
-            ),
-            packer=self._rpc_manager.data_packer,
-            url=self._rpc_manager.redis_url
-        )
-        self._request_mailbox.subscribe()
+            )
+            self._request_stream.create_group()
+        else:
+            self._request_mailbox = Mailbox(
+                self._rpc_manager.get_service_instance_mailbox_channel(
+                    self.service_name,
+                    self.service_uuid
+                ),
+                packer=self._rpc_manager.data_packer,
+                url=self._rpc_manager.redis_url
+            )
+            self._request_mailbox.subscribe()
 
     def unregister(self):
         self._rpc_manager.unregister_service(self.service_name, self.service_uuid)
 
+        if self._thread_executor:
+            self._thread_executor.shutdown(wait=False)
+        if self._process_executor:
+            self._process_executor.shutdown(wait=False)
+
     @property
     def service_name(self):
         return self.__class__.__name__ if not self._service_name else self._service_name
@@ -89,11 +173,30 @@ class RPCService(object):
     def enable_multi_instance(self):
         return self._enable_multi_instance
 
+    @property
+    def transport(self):
+        return self._transport
+
     def heartbeat(self):
         if not self._rpc_manager.service_heartbeat(self.service_name, self.service_uuid):
             # TODO: log dead
             self._register()
 
+        if self.transport == TRANSPORT_STREAM:
+            self._claim_stale_stream_requests()
+
+    def _claim_stale_stream_requests(self):
+        # requests read by a dead instance are never acknowledged, take them over.
+        now = self._rpc_manager.time
+        if now - self._last_stream_claim_time < self.STREAM_CLAIM_INTERVAL:
+            return
+        self._last_stream_claim_time = now
+
+        pending_ids = set(entry_id for entry_id, _ in list(self._stream_entries))
+        pending_ids.update(self._processing_stream_entry_ids)
+        entries = self._request_stream.claim_stale(self._rpc_manager.SERVICE_TTL * 1000)
+        self._stream_entries.extend(entry for entry in entries if entry[0] not in pending_ids)
+
     def start_background_running(self):
         self.start_heartbeat()
         self.start_process()
@@ -102,11 +205,15 @@ class RPCService(object):
         self.stop_heartbeat()
         self.stop_process()
 
-    def _process_request(self, rpc_data):
-        method_name = rpc_data["method_name"]
-        args = rpc_data["args"]
-        kwargs = rpc_data["kwargs"]
+    def _call_remote_method(self, rpc_data):
+        batch = rpc_data.get("batch")
+        if batch:
+            # the return value of a batch is [[return_value, exception], ...]
+            return [list(self._call_method(*call)) for call in batch], None
 
+        return self._call_method(rpc_data["method_name"], rpc_data["args"], rpc_data["kwargs"])
+
+    def _call_method(self, method_name, args, kwargs):
         return_value = None
         exception = None
 
@@ -114,21 +221,36 @@ class RPCService(object):
 
             # TODO: not found method_name?
             method = self._remote_methods[method_name]
-            return_value = method(*args, **kwargs)
+            if self._process_executor and self.rpc_method_options.get(method_name, {}).get("cpu_bound"):
+                future = self._process_executor.submit(
+                    _call_remote_method_in_process,
+                    self.__class__,
+                    method_name,
+                    args,
+                    kwargs
+                )
+                return_value = future.result()
+            else:
+                return_value = method(*args, **kwargs)
 
         except Exception as ex:
             exception = ex
 
+        return return_value, exception
+
+    def _set_return(self, rpc_data, return_value, exception):
         rpc_data["return_value"] = return_value
         rpc_data["exception"] = exception
         rpc_data["return_time"] = self._rpc_manager.time
 
-        return_mailbox = Mailbox(
+        return Mailbox(
             rpc_data["return_mailbox"],
             url=self._rpc_manager.redis_url,
             packer=self._rpc_manager.data_packer
         )
 
+    def _send_return(self, rpc_data, return_value, exception):
+        return_mailbox = self._set_return(rpc_data, return_value, exception)
         return_mailbox.set_message(rpc_data)
 
         self._rpc_manager.increase_total_return(
@@ -136,24 +258,114 @@ class RPCService(object):
             rpc_data["service_uuid"]
         )
 
-    def process(self):
-        rpc_data = self._request_mailbox.get_message()
-        if rpc_data and rpc_data.get("rpc_uuid"):
-            if self._process_request_in_thread:
-                t = threading.Thread(target=self._process_request, args=(rpc_data,))
-                t.start()
-            else:
-                self._process_request(rpc_data)
-            return True
+    def _process_request(self, rpc_data):
+        return_value, exception = self._call_remote_method(rpc_data)
+        self._send_return(rpc_data, return_value, exception)
+
+    def _ack_request(self, entry_id):
+        if entry_id is not None:
+            self._request_stream.ack(entry_id)
+            self._processing_stream_entry_ids.discard(entry_id)
+
+    def _handle_request(self, entry_id, rpc_data):
+        try:
+            self._process_request(rpc_data)
+        finally:
+            self._ack_request(entry_id)
+
+    def _reject_request(self, entry_id, rpc_data, exception):
+        try:
+            self._send_return(rpc_data, None, exception)
+        finally:
+            self._ack_request(entry_id)
+
+    def _get_request(self, timeout=0):
+        """
+        :param timeout: seconds to wait for a request, 0 for no waiting
+        :return: (entry_id, rpc_data) of the next request, entry_id is None if the request
+            needs no acknowledgement, or None if there is no request.
+        """
+        if self.transport == TRANSPORT_STREAM:
+            if not self._stream_entries:
+                block = int(timeout * 1000) if timeout > 0 else None
+                self._stream_entries.extend(self._request_stream.read_group(self.STREAM_READ_COUNT, block))
+            if not self._stream_entries:
+                return None
+            entry = self._stream_entries.popleft()
+            self._processing_stream_entry_ids.add(entry[0])
+            return entry
+
+        rpc_data = self._request_mailbox.get_message(timeout)
+        if rpc_data:
+            return None, rpc_data
+        return None
+
+    def _on_request_done(self, future):
+        with self._pending_request_lock:
+            self._pending_request_count -= 1
+
+    def _submit_request(self, entry_id, rpc_data):
+        with self._pending_request_lock:
+            is_busy = 0 < self._max_pending_requests <= self._pending_request_count
+            if not is_busy:
+                self._pending_request_count += 1
+
+        if is_busy:
+            self._reject_request(
+                entry_id,
+                rpc_data,
+                RPCServiceBusyError(
+                    "service {service_name} {service_uuid} is busy, {count} requests are pending.".format(
+                        service_name=self.service_name,
+                        service_uuid=self.service_uuid,
+                        count=self._max_pending_requests
+                    )
+                )
+            )
+            return
+
+        future = self._thread_executor.submit(self._handle_request, entry_id, rpc_data)
+        future.add_done_callback(self._on_request_done)
+
+    @property
+    def pending_request_count(self):
+        return self._pending_request_count
+
+    def process(self, timeout=0):
+        """
+        process one request.
+        :param timeout: seconds to wait for a request, 0 for no waiting
+        :return: True if a request is processed
+        """
+        request = self._get_request(timeout)
+        if not request:
+            return False
+
+        entry_id, rpc_data = request
+        if not rpc_data or not rpc_data.get("rpc_uuid"):
+            self._ack_request(entry_id)
+        elif self._process_request_in_thread:
+            self._submit_request(entry_id, rpc_data)
+        else:
+            self._handle_request(entry_id, rpc_data)
 
-        return False
+        return True
 
     def _process_in_thread(self):
         while self._is_process_thread_running:
+            if self._blocking_dispatch:
+                self.process(self.BLOCKING_DISPATCH_TIMEOUT)
+                continue
+
             while self.process():
                 pass
             time.sleep(self.CHECK_REQUEST_INTERVAL)
 
+    def _wake_up_process_thread(self):
+        # an empty message makes a blocking get_message return at once.
+        if self._request_mailbox is not None:
+            self._request_mailbox.set_message(None)
+
     def start_process(self):
         assert self._process_thread is None, "process thread is already running."
         self._is_process_thread_running = True
@@ -163,6 +375,8 @@ class RPCService(object):
     def stop_process(self):
         assert self._process_thread is not None, "process thread is not running."
         self._is_process_thread_running = False
+        if self._blocking_dispatch:
+            self._wake_up_process_thread()
         self._process_thread.join()
         self._process_thread = None
 
@@ -184,6 +398,203 @@ class RPCService(object):
         self._heartbeat_thread = None
 
 
+class AsyncRPCService(RPCService):
+    """
+    RPCService processing requests on an event loop, coroutine remote methods are awaited
+    concurrently and other remote methods run in the default executor of the loop.
+    """
+
+    def __init__(self,
+                 service_name="",
+                 enable_multi_instance=True,
+                 rpc_manager=None,
+                 transport=TRANSPORT_PUBSUB,
+                 max_concurrency=1000
+                 ):
+        """
+        :param max_concurrency: max number of requests processing at the same time,
+            no more request is read until one of them returns.
+        """
+        self._max_concurrency = max_concurrency
+        self._serving_loop = None
+        self._stop_serving = None
+        self._subscribed_channel = None
+
+        super(AsyncRPCService, self).__init__(
+            service_name,
+            enable_multi_instance,
+            process_request_in_thread=False,
+            rpc_manager=rpc_manager,
+            transport=transport
+        )
+
+    def _open_request_channel(self):
+        if self.transport == TRANSPORT_STREAM:
+            super(AsyncRPCService, self)._open_request_channel()
+        else:
+            # requests are read by the serving loop
+            self._request_mailbox = Mailbox(
+                self._rpc_manager.get_service_instance_mailbox_channel(
+                    self.service_name,
+                    self.service_uuid
+                ),
+                packer=self._rpc_manager.data_packer,
+                url=self._rpc_manager.redis_url
+            )
+
+    def process(self, timeout=0):
+        raise NotImplementedError("AsyncRPCService processes requests in serve().")
+
+    async def _async_call_remote_method(self, rpc_data):
+        batch = rpc_data.get("batch")
+        if batch:
+            results = await asyncio.gather(*[self._async_call_method(*call) for call in batch])
+            return [list(result) for result in results], None
+
+        return await self._async_call_method(rpc_data["method_name"], rpc_data["args"], rpc_data["kwargs"])
+
+    async def _async_call_method(self, method_name, args, kwargs):
+        return_value = None
+        exception = None
+
+        try:
+
+            method = self._remote_methods[method_name]
+            if asyncio.iscoroutinefunction(method):
+                return_value = await method(*args, **kwargs)
+            else:
+                return_value = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    functools.partial(method, *args, **kwargs)
+                )
+
+        except Exception as ex:
+            exception = ex
+
+        return return_value, exception
+
+    async def _async_handle_request(self, entry_id, rpc_data, semaphore):
+        try:
+            return_value, exception = await self._async_call_remote_method(rpc_data)
+            return_mailbox = self._set_return(rpc_data, return_value, exception)
+            await return_mailbox.async_set_message(rpc_data)
+            await self._rpc_manager.async_increase_total_return(
+                rpc_data["service_name"],
+                rpc_data["service_uuid"]
+            )
+        finally:
+            if entry_id is not None:
+                await self._request_stream.async_ack(entry_id)
+                self._processing_stream_entry_ids.discard(entry_id)
+            semaphore.release()
+
+    async def _async_get_requests(self, pubsub):
+        """
+        :return: [(entry_id, rpc_data), ...]
+        """
+        if self.transport == TRANSPORT_STREAM:
+            if not self._stream_entries:
+                self._stream_entries.extend(
+                    await self._request_stream.async_read_group(
+                        self.STREAM_READ_COUNT,
+                        int(self.BLOCKING_DISPATCH_TIMEOUT * 1000)
+                    )
+                )
+            requests = []
+            while self._stream_entries:
+                entry = self._stream_entries.popleft()
+                self._processing_stream_entry_ids.add(entry[0])
+                requests.append(entry)
+            return requests
+
+        # service_uuid changes if the service registers again in heartbeat
+        channel = self._request_mailbox.channel
+        if channel != self._subscribed_channel:
+            if self._subscribed_channel:
+                await pubsub.unsubscribe(self._subscribed_channel)
+            await pubsub.subscribe(channel)
+            self._subscribed_channel = channel
+
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.BLOCKING_DISPATCH_TIMEOUT)
+        if message and message["type"] == "message":
+            return [(None, self._request_mailbox.packer.unpack(message["data"]))]
+        return []
+
+    async def _serve_requests(self):
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        tasks = set()
+
+        pubsub = None
+        self._subscribed_channel = None
+        if self.transport != TRANSPORT_STREAM:
+            pubsub = redis_connection.get_async_redis(self._rpc_manager.redis_url).pubsub()
+
+        try:
+            while not self._stop_serving.is_set():
+                for entry_id, rpc_data in await self._async_get_requests(pubsub):
+                    if not rpc_data or not rpc_data.get("rpc_uuid"):
+                        if entry_id is not None:
+                            await self._request_stream.async_ack(entry_id)
+                            self._processing_stream_entry_ids.discard(entry_id)
+                        continue
+
+                    await semaphore.acquire()
+                    task = asyncio.ensure_future(self._async_handle_request(entry_id, rpc_data, semaphore))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.wait(tasks)
+
+        finally:
+            if pubsub is not None:
+                await getattr(pubsub, "aclose", pubsub.reset)()
+
+    async def _heartbeat_in_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self._stop_serving.is_set():
+            await loop.run_in_executor(None, self.heartbeat)
+            try:
+                await asyncio.wait_for(self._stop_serving.wait(), self._rpc_manager.SERVICE_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def serve(self, heartbeat=True):
+        """
+        process requests on the running event loop until stop_serving is called.
+        :param heartbeat: send heartbeat on the loop too.
+        """
+        assert self._serving_loop is None, "service is already serving."
+        self._serving_loop = asyncio.get_running_loop()
+        self._stop_serving = asyncio.Event()
+
+        try:
+            if heartbeat:
+                await asyncio.gather(self._heartbeat_in_loop(), self._serve_requests())
+            else:
+                await self._serve_requests()
+        finally:
+            self._serving_loop = None
+
+    def stop_serving(self):
+        """
+        stop serve(), can be called from any thread.
+        """
+        if self._serving_loop:
+            self._serving_loop.call_soon_threadsafe(self._stop_serving.set)
+
+    def _process_in_thread(self):
+        asyncio.run(self.serve(heartbeat=False))
+
+    def stop_process(self):
+        assert self._process_thread is not None, "process thread is not running."
+        while self._process_thread.is_alive() and not self._serving_loop:
+            time.sleep(self.CHECK_REQUEST_INTERVAL)
+        self.stop_serving()
+        self._process_thread.join()
+        self._process_thread = None
+
+
 class RPCClientMethod(object):
     def __init__(self, client, method_name):
         super(RPCClientMethod, self).__init__()
@@ -195,7 +606,17 @@ class RPCClientMethod(object):
 
 
 class RPCClient(object):
-    def __init__(self, service_name, service_uuid=None, rpc_manager=None):
+    """
+    client of a service, every call is sent to an alive service instance selected by the load balancer,
+    or to the service instance of service_uuid while it is alive.
+    """
+
+    def __init__(self, service_name, service_uuid=None, rpc_manager=None,
+                 load_balancer=LOAD_BALANCER_POWER_OF_TWO_CHOICES):
+        """
+        :param load_balancer: name in load_balancer.LOAD_BALANCERS or a LoadBalancer,
+            not used by stream transport, whose service instances share the requests.
+        """
         super(RPCClient, self).__init__()
         self._rpc_manager = DefaultRPCManager() if not rpc_manager else rpc_manager
 
@@ -203,9 +624,13 @@ class RPCClient(object):
 
         self._service_name = service_name
         self._method_list = self._rpc_manager.get_method_list(service_name)
+        self._transport = self._rpc_manager.get_transport(service_name)
+
+        self._load_balancer = get_load_balancer(load_balancer)
 
         if service_uuid and service_uuid not in self._rpc_manager.get_alive_service_uuid_set(self._service_name):
             service_uuid = None
+        self._pinned_service_uuid = service_uuid
         if service_uuid:
             self._service_uuid = service_uuid
         else:
@@ -215,14 +640,11 @@ class RPCClient(object):
 
         assert self.service_uuid, "not available service instance."
 
-        self._request_mailbox = Mailbox(
-            self._rpc_manager.get_service_instance_mailbox_channel(
-                self.service_name,
-                self.service_uuid
-            ),
-            packer=self._rpc_manager.data_packer,
-            url=self._rpc_manager.redis_url
-        )
+        # service_uuid -> request mailbox
+        self._request_mailboxes = {}
+        self._request_stream = None
+        if self._transport == TRANSPORT_STREAM:
+            self._request_stream = self._rpc_manager.get_service_request_stream(self.service_name)
 
         self._return_mailbox = Mailbox(
             self._rpc_manager.get_client_mailbox_channel(
@@ -233,9 +655,8 @@ class RPCClient(object):
             packer=self._rpc_manager.data_packer,
             url=self._rpc_manager.redis_url
         )
-        self._return_mailbox.subscribe()
 
-        self._return_rpc_data_cache = {}
+        self._return_dispatcher = ReturnDispatcher(self._return_mailbox, self._rpc_manager)
 
     @property
     def service_name(self):
@@ -243,52 +664,113 @@ class RPCClient(object):
 
     @property
     def service_uuid(self):
+        """
+        service_uuid of the last selected service instance.
+        """
         return self._service_uuid
 
+    @property
+    def load_balancer(self):
+        return self._load_balancer
+
     @property
     def client_uuid(self):
         return self._client_uuid
 
+    @property
+    def transport(self):
+        return self._transport
+
+    @property
+    def request_channel(self):
+        if self._request_stream is not None:
+            return self._request_stream.key
+        return self._get_request_mailbox(self.service_uuid).channel
+
+    def _get_request_mailbox(self, service_uuid):
+        request_mailbox = self._request_mailboxes.get(service_uuid)
+        if request_mailbox is None:
+            request_mailbox = Mailbox(
+                self._rpc_manager.get_service_instance_mailbox_channel(
+                    self.service_name,
+                    service_uuid
+                ),
+                packer=self._rpc_manager.data_packer,
+                url=self._rpc_manager.redis_url
+            )
+            self._request_mailboxes[service_uuid] = request_mailbox
+        return request_mailbox
+
+    def _select_service_uuid(self):
+        if self._request_stream is not None:
+            return self._service_uuid
+
+        service_uuids = self._rpc_manager.get_alive_service_uuid_set(self.service_name)
+        if self._pinned_service_uuid and self._pinned_service_uuid in service_uuids:
+            return self._pinned_service_uuid
+
+        # keep the last service instance if none is alive, the call fails by timeout.
+        if service_uuids:
+            self._service_uuid = self._load_balancer.select(service_uuids)
+        return self._service_uuid
+
+    def _track_outstanding(self, future, service_uuid):
+        self._load_balancer.begin(service_uuid)
+        future.add_done_callback(lambda _: self._load_balancer.end(service_uuid))
+
     def get_methods(self):
         return self._method_list
 
-    def call_method(self, method_name, args, kwargs):
-        rpc_uuid, expire_time = self.set_call_method_request(method_name, args, kwargs)
-        rpc_data = self.get_call_method_result_with_uuid(rpc_uuid, expire_time)
-        if rpc_data:
+    def _make_timeout_error(self, method_name):
+        # the service instance may be dead, refresh the alive service instances for the next call.
+        self._rpc_manager.invalidate_discovery_cache(self.service_name)
+        return TimeoutError(
+            "call {mailbox_channel} method {method_name} failed".format(
+                mailbox_channel=self.request_channel,
+                method_name=method_name
+            )
+        )
 
-            return_value = rpc_data.get("return_value")
-            exception = rpc_data.get("exception")
+    @staticmethod
+    def _get_return_value(rpc_data):
+        return_value = rpc_data.get("return_value")
+        exception = rpc_data.get("exception")
 
-            if exception:
-                raise exception
+        if exception:
+            raise exception
 
-            return return_value
+        return return_value
 
+    def call_method(self, method_name, args, kwargs):
+        rpc_uuid, expire_time = self.set_call_method_request(method_name, args, kwargs)
+        rpc_data = self.get_call_method_result_with_uuid(rpc_uuid, expire_time)
+        if rpc_data:
+            return self._get_return_value(rpc_data)
         else:
-            raise TimeoutError(
-                "call {mailbox_channel} method {method_name} failed".format(
-                    mailbox_channel=self._request_mailbox.channel,
-                    method_name=method_name
-                )
-            )
+            raise self._make_timeout_error(method_name)
 
-    def set_call_method_request(self, method_name, args, kwargs):
+    def _make_rpc_data(self, method_name, args, kwargs):
         rpc_uuid = self._rpc_manager.gen_rpc_uuid()
         request_time = self._rpc_manager.time
         expire_time = request_time + self._rpc_manager.RPC_EXPIRE
-        rpc_data = {
+        service_uuid = self._select_service_uuid()
+        if self._request_stream is not None:
+            request_mailbox = self._request_stream.key
+        else:
+            request_mailbox = self._get_request_mailbox(service_uuid).channel
+        return {
             "rpc_uuid": rpc_uuid,
 
-            "request_mailbox": self._request_mailbox.channel,
+            "request_mailbox": request_mailbox,
             "return_mailbox": self._return_mailbox.channel,
 
             "service_name": self.service_name,
-            "service_uuid": self.service_uuid,
+            "service_uuid": service_uuid,
 
             "method_name": method_name,
             "args": args,
             "kwargs": kwargs,
+            "batch": None,
             "return_value": None,
             "exception": None,
 
@@ -297,49 +779,131 @@ class RPCClient(object):
             "return_time": None,
         }
 
-        self._request_mailbox.set_message(rpc_data)
+    def _make_batch_rpc_data(self, calls):
+        rpc_data = self._make_rpc_data(None, (), {})
+        rpc_data["batch"] = [(method_name, args, kwargs) for method_name, args, kwargs in calls]
+        return rpc_data
 
-        self._rpc_manager.increase_total_request(self.service_name, self.service_uuid)
+    def _get_batch_return_values(self, rpc_data, return_exceptions):
+        results = []
+        for return_value, exception in self._get_return_value(rpc_data):
+            if exception and not return_exceptions:
+                raise exception
+            results.append(exception if exception else return_value)
+        return results
 
-        return rpc_uuid, expire_time
+    def set_call_method_request(self, method_name, args, kwargs):
+        return self._set_request(self._make_rpc_data(method_name, args, kwargs))
 
-    def get_call_method_result_with_uuid(self, rpc_uuid, expire_time):
+    def _set_request(self, rpc_data):
+        future = self._return_dispatcher.register(rpc_data["rpc_uuid"], rpc_data["expire_time"])
+        self._track_outstanding(future, rpc_data["service_uuid"])
 
-        while True:
-            timeout = expire_time - self._rpc_manager.time
+        if self._request_stream is not None:
+            self._request_stream.add(rpc_data)
+        else:
+            self._get_request_mailbox(rpc_data["service_uuid"]).set_message(rpc_data)
+
+        self._rpc_manager.increase_total_request(self.service_name, rpc_data["service_uuid"])
+
+        return rpc_data["rpc_uuid"], rpc_data["expire_time"]
+
+    def set_call_method_requests(self, calls):
+        """
+        send the requests of many calls in one round trip.
+        :param calls: [(method_name, args, kwargs), ...]
+        :return: [(rpc_uuid, expire_time), ...]
+        """
+        rpc_data_list = [self._make_rpc_data(method_name, args, kwargs) for method_name, args, kwargs in calls]
+
+        # service_uuid -> [rpc_data, ...]
+        service_requests = {}
+        for rpc_data in rpc_data_list:
+            future = self._return_dispatcher.register(rpc_data["rpc_uuid"], rpc_data["expire_time"])
+            self._track_outstanding(future, rpc_data["service_uuid"])
+            service_requests.setdefault(rpc_data["service_uuid"], []).append(rpc_data)
+
+        for service_uuid, service_rpc_data_list in service_requests.items():
+            if self._request_stream is not None:
+                self._request_stream.add_many(service_rpc_data_list)
+            else:
+                self._get_request_mailbox(service_uuid).set_messages(service_rpc_data_list)
+
+            self._rpc_manager.increase_total_request(self.service_name, service_uuid, len(service_rpc_data_list))
+
+        return [(rpc_data["rpc_uuid"], rpc_data["expire_time"]) for rpc_data in rpc_data_list]
+
+    def call_many(self, calls, return_exceptions=False):
+        """
+        call many methods with pipelined requests.
+        :param calls: [(method_name, args, kwargs), ...]
+        :param return_exceptions: exceptions are returned in the results instead of raised.
+        :return: return values in the order of calls
+        """
+        requests = self.set_call_method_requests(calls)
+
+        results = []
+        for (method_name, _, _), (rpc_uuid, expire_time) in zip(calls, requests):
+            rpc_data = self.get_call_method_result_with_uuid(rpc_uuid, expire_time)
+            try:
+                if not rpc_data:
+                    raise self._make_timeout_error(method_name)
+                results.append(self._get_return_value(rpc_data))
+            except Exception as ex:
+                if not return_exceptions:
+                    raise
+                results.append(ex)
+
+        return results
+
+    def call_batch(self, calls, return_exceptions=False):
+        """
+        call many methods in one request, the service runs them in order and returns
+        all the results in one return.
+        :param calls: [(method_name, args, kwargs), ...]
+        :param return_exceptions: exceptions are returned in the results instead of raised.
+        :return: return values in the order of calls
+        """
+        rpc_uuid, expire_time = self._set_request(self._make_batch_rpc_data(calls))
+        rpc_data = self.get_call_method_result_with_uuid(rpc_uuid, expire_time)
+        if not rpc_data:
+            raise self._make_timeout_error("batch")
 
-            # try cache
-            rpc_data = self._return_rpc_data_cache.pop(rpc_uuid, None)
+        return self._get_batch_return_values(rpc_data, return_exceptions)
 
-            if not rpc_data:
-                if timeout > 0:
-                    rpc_data = self._return_mailbox.get_message(timeout)
-                else:
-                    return None
+    def batch(self, return_exceptions=False, single_request=False):
+        """
+        collect calls and send them at the end of a with block,
+        with call_batch if single_request else with call_many.
 
-            if rpc_data:
-                return_rpc_data_uuid = rpc_data.get("rpc_uuid")
-                if return_rpc_data_uuid == rpc_uuid:
-                    return rpc_data
-                elif return_rpc_data_uuid:
-                    self._return_rpc_data_cache[return_rpc_data_uuid] = rpc_data
+            with client.batch() as batch:
+                batch.add(1, 2)
+                batch.add(3, 4)
+            batch.results  # [3, 7]
+        """
+        return RPCClientBatch(self, return_exceptions, single_request)
+
+    def get_call_method_result_with_uuid(self, rpc_uuid, expire_time):
+        future = self._return_dispatcher.get_future(rpc_uuid)
+        if not future:
+            return None
+
+        try:
+            return future.result(max(0., expire_time - self._rpc_manager.time))
+        except FutureTimeoutError:
+            return None
+        finally:
+            self._return_dispatcher.discard(rpc_uuid)
 
     def get_call_method_result_with_uuid_noblock(self, rpc_uuid):
-        while True:
-            # try cache
-            rpc_data = self._return_rpc_data_cache.pop(rpc_uuid, None)
-
-            if not rpc_data:
-                rpc_data = self._return_mailbox.get_message()
-
-            if rpc_data:
-                return_rpc_data_uuid = rpc_data.get("rpc_uuid")
-                if return_rpc_data_uuid == rpc_uuid:
-                    return rpc_data
-                elif return_rpc_data_uuid:
-                    self._return_rpc_data_cache[return_rpc_data_uuid] = rpc_data
-            else:
-                return None
+        future = self._return_dispatcher.get_future(rpc_uuid)
+        if future and future.done():
+            self._return_dispatcher.discard(rpc_uuid)
+            return future.result()
+        return None
+
+    def close(self):
+        self._return_dispatcher.stop()
 
     def __getattr__(self, method_name):
         if self._method_list and method_name in self._method_list:
@@ -347,6 +911,39 @@ class RPCClient(object):
         raise AttributeError("type object '%s' has no attribute '%s'" % (self.__class__.__name__, method_name))
 
 
+class RPCClientBatch(object):
+    def __init__(self, client, return_exceptions=False, single_request=False):
+        super(RPCClientBatch, self).__init__()
+        self._client = client
+        self._return_exceptions = return_exceptions
+        self._single_request = single_request
+        self._calls = []
+        self.results = None
+
+    def call_method(self, method_name, args, kwargs):
+        self._calls.append((method_name, args, kwargs))
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        if self._single_request:
+            self.results = self._client.call_batch(calls, self._return_exceptions)
+        else:
+            self.results = self._client.call_many(calls, self._return_exceptions)
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def __getattr__(self, method_name):
+        if method_name in self._client.get_methods():
+            return RPCClientMethod(self, method_name)
+        raise AttributeError("type object '%s' has no attribute '%s'" % (self.__class__.__name__, method_name))
+
+
 class AsyncRPCClientMethod(object):
     def __init__(self, client, method_name):
         super(AsyncRPCClientMethod, self).__init__()
@@ -358,35 +955,110 @@ class AsyncRPCClientMethod(object):
 
 
 class AsyncRPCClient(RPCClient):
-    ASYNC_GET_POLL_INTERVAL = 0.01
+    """
+    RPCClient working with asyncio, returns are read by one reader task per event loop
+    and dispatched to the futures of the awaiting calls.
+    """
+
+    def __init__(self, service_name, service_uuid=None, rpc_manager=None,
+                 load_balancer=LOAD_BALANCER_POWER_OF_TWO_CHOICES):
+        super(AsyncRPCClient, self).__init__(service_name, service_uuid, rpc_manager, load_balancer)
+
+        self._reader_loop = None
+        self._reader_task = None
+        self._reader_subscribed = None
+        self._return_futures = {}
+
+    async def _read_returns(self, subscribed):
+        redis_ = redis_connection.get_async_redis(self._rpc_manager.redis_url)
+        pubsub = redis_.pubsub()
+        return_futures = self._return_futures
+        try:
+            await pubsub.subscribe(self._return_mailbox.channel)
+            subscribed.set_result(True)
 
-    def __init__(self, service_name, service_uuid=None, rpc_manager=None):
-        super(AsyncRPCClient, self).__init__(service_name, service_uuid, rpc_manager)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
 
-    async def async_call_method(self, method_name, args, kwargs):
-        rpc_uuid, expire_time = self.set_call_method_request(method_name, args, kwargs)
+                rpc_data = self._return_mailbox.packer.unpack(message["data"])
+                future = return_futures.pop(rpc_data.get("rpc_uuid"), None)
+                if future and not future.done():
+                    future.set_result(rpc_data)
 
-        while True:
+        except Exception as ex:
+            # the reader is restarted by the next call.
+            if not subscribed.done():
+                subscribed.set_exception(ex)
+            for future in return_futures.values():
+                if not future.done():
+                    future.set_exception(ex)
+            return_futures.clear()
+
+        finally:
+            # aclose is added in redis-py 5.0.1
+            await getattr(pubsub, "aclose", pubsub.reset)()
+
+    async def _start_reader(self):
+        loop = asyncio.get_running_loop()
+        if self._reader_loop is not loop or self._reader_task.done():
+            self._reader_loop = loop
+            self._return_futures = {}
+            self._reader_subscribed = loop.create_future()
+            self._reader_task = loop.create_task(self._read_returns(self._reader_subscribed))
+
+        await asyncio.shield(self._reader_subscribed)
+
+    async def close(self):
+        if self._reader_task and self._reader_loop is asyncio.get_running_loop():
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        self._reader_loop = None
+        self._reader_task = None
 
-            rpc_data = self.get_call_method_result_with_uuid_noblock(rpc_uuid)
-            if not rpc_data:
-                if expire_time - self._rpc_manager.time < 0:
-                    raise TimeoutError(
-                        "call {mailbox_channel} method {method_name} failed".format(
-                            mailbox_channel=self._request_mailbox.channel,
-                            method_name=method_name
-                        )
-                    )
-                await asyncio.sleep(self.ASYNC_GET_POLL_INTERVAL)
-                continue
+    async def async_set_call_method_request(self, method_name, args, kwargs):
+        """
+        :return: rpc_uuid, expire_time and the future of the return rpc_data
+        """
+        return await self._async_set_request(self._make_rpc_data(method_name, args, kwargs))
 
-            return_value = rpc_data.get("return_value")
-            exception = rpc_data.get("exception")
+    async def _async_set_request(self, rpc_data):
+        await self._start_reader()
 
-            if exception:
-                raise exception
+        rpc_uuid = rpc_data["rpc_uuid"]
+        future = self._reader_loop.create_future()
+        self._return_futures[rpc_uuid] = future
+        self._track_outstanding(future, rpc_data["service_uuid"])
+
+        if self._request_stream is not None:
+            await self._request_stream.async_add(rpc_data)
+        else:
+            await self._get_request_mailbox(rpc_data["service_uuid"]).async_set_message(rpc_data)
+
+        await self._rpc_manager.async_increase_total_request(self.service_name, rpc_data["service_uuid"])
 
-            return return_value
+        return rpc_uuid, rpc_data["expire_time"], future
+
+    async def _async_get_result(self, rpc_uuid, expire_time, future, method_name):
+        try:
+            return await asyncio.wait_for(future, max(0., expire_time - self._rpc_manager.time))
+        except asyncio.TimeoutError:
+            raise self._make_timeout_error(method_name)
+        finally:
+            self._return_futures.pop(rpc_uuid, None)
+
+    async def async_call_batch(self, calls, return_exceptions=False):
+        rpc_uuid, expire_time, future = await self._async_set_request(self._make_batch_rpc_data(calls))
+        rpc_data = await self._async_get_result(rpc_uuid, expire_time, future, "batch")
+        return self._get_batch_return_values(rpc_data, return_exceptions)
+
+    async def async_call_method(self, method_name, args, kwargs):
+        rpc_uuid, expire_time, future = await self.async_set_call_method_request(method_name, args, kwargs)
+        rpc_data = await self._async_get_result(rpc_uuid, expire_time, future, method_name)
+        return self._get_return_value(rpc_data)
 
     def __getattr__(self, method_name):
         if self._method_list and method_name in self._method_list:
@@ -9,6 +9,9 @@ Description:
     rpc_data.py
 ----------------------------------------------------------------------------"""
 
+TRANSPORT_PUBSUB = "pubsub"
+TRANSPORT_STREAM = "stream"
+
 DEFAULT_RPC_DATA = {
     "rpc_uuid": None,
 
@@ -21,6 +24,7 @@ DEFAULT_RPC_DATA = {
     "method_name": "",
     "args": [],
     "kwargs": {},
+    "batch": None,
     "return_value": None,
     "exception": None,
 
@@ -33,6 +37,7 @@ DEFAULT_SERVICE_DATA = {
     "service_name": "",
     "method_list": [],
     "enable_multi_instance": True,
+    "transport": TRANSPORT_PUBSUB,
 
     "service_uuid_set_key": None,
 
@@ -9,7 +9,9 @@ Description:
     rpc_manager.py
 ----------------------------------------------------------------------------"""
 
+import time
 import random
+import threading
 import shortuuid
 from .singleton import Singleton
 from . import redis_connection
@@ -19,8 +21,41 @@ from .redis_collections.set import Set
 from .redis_collections.list import List
 from .redis_collections.queue import Queue
 from .redis_collections.mailbox import Mailbox
+from .redis_collections.stream import Stream
 
 from .rpc_data import DEFAULT_SERVICE_DATA
+from .rpc_data import TRANSPORT_PUBSUB
+
+
+# KEYS[1]: service uuid set, KEYS[2..]: service instances
+# ARGV[1]: now, ARGV[2]: service ttl,
+# ARGV[3..5]: packed field names of last_heartbeat_time, total_return, total_require,
+# ARGV[6..]: packed service uuids of KEYS[2..]
+# dead service instances are removed, returns packed service uuids of alive instances in ascending loss rate.
+ALIVE_SERVICE_INSTANCE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local service_ttl = tonumber(ARGV[2])
+local alive = {}
+for i = 2, #KEYS do
+    local service_uuid = ARGV[i + 4]
+    local values = redis.call("HMGET", KEYS[i], ARGV[3], ARGV[4], ARGV[5])
+    local last_heartbeat_time = tonumber(values[1])
+    if last_heartbeat_time and now - last_heartbeat_time < service_ttl then
+        local total_return = math.max(1, tonumber(values[2]) or 0)
+        local total_require = math.max(1, tonumber(values[3]) or 0)
+        table.insert(alive, {service_uuid, 1 - total_return / total_require})
+    else
+        redis.call("SREM", KEYS[1], service_uuid)
+        redis.call("DEL", KEYS[i])
+    end
+end
+table.sort(alive, function(a, b) return a[2] < b[2] end)
+local result = {}
+for i, instance in ipairs(alive) do
+    result[i] = instance[1]
+end
+return result
+"""
 
 
 def generate_uuid():
@@ -39,7 +74,9 @@ class RPCManager(object):
     GROUP_KEY_PATTERN = "rpc_group[{group_name}]"
     SERVICE_TTL = 3.000  # s
     SERVICE_HEARTBEAT_INTERVAL = 0.100  # s
+    DISCOVERY_LISTEN_TIMEOUT = 1.000  # s
     RPC_EXPIRE = 10.000  # s
+    REQUEST_STREAM_MAX_LENGTH = 100000
 
     @staticmethod
     def gen_service_uuid():
@@ -64,6 +101,20 @@ class RPCManager(object):
             url=redis_url
         )
 
+        self._service_uuid_sets = {}
+        self._service_instances = {}
+
+        self._alive_service_instance_script = redis_connection.get_redis(redis_url).register_script(
+            ALIVE_SERVICE_INSTANCE_SCRIPT
+        )
+
+        # key -> (expire_time, value), see _get_discovery_cache
+        self._discovery_cache = {}
+        # increased by every invalidation, results loaded across an invalidation are not cached
+        self._discovery_generation = 0
+        self._discovery_mailbox = None
+        self._discovery_lock = threading.Lock()
+
     @property
     def data_packer(self):
         return self._data_packer
@@ -84,6 +135,73 @@ class RPCManager(object):
     def service_dict_key(self):
         return ".".join([self.group_key, "service_dict"])
 
+    @property
+    def discovery_channel(self):
+        return ".".join([self.group_key, "discovery"])
+
+    def _start_discovery_listener(self):
+        if self._discovery_mailbox:
+            return
+
+        with self._discovery_lock:
+            if self._discovery_mailbox:
+                return
+
+            mailbox = Mailbox(
+                self.discovery_channel,
+                msg_handler=self._on_discovery_message,
+                packer=self._data_packer,
+                url=self._redis_url
+            )
+            mailbox.subscribe()
+            mailbox.run_in_background(sleep_time=self.DISCOVERY_LISTEN_TIMEOUT, daemon=True)
+            self._discovery_mailbox = mailbox
+
+    def stop_discovery_listener(self):
+        with self._discovery_lock:
+            if self._discovery_mailbox:
+                self._discovery_mailbox.stop_background_thread()
+                self._discovery_mailbox = None
+        self.invalidate_discovery_cache()
+
+    def _on_discovery_message(self, data):
+        self.invalidate_discovery_cache(data.get("service_name") if data else None)
+
+    def _notify_discovery(self, service_name):
+        self.invalidate_discovery_cache(service_name)
+        Mailbox(
+            self.discovery_channel,
+            packer=self._data_packer,
+            url=self._redis_url
+        ).set_message({"service_name": service_name})
+
+    def _get_discovery_cache(self, key, load):
+        """
+        discovery results are cached for SERVICE_HEARTBEAT_INTERVAL, and dropped at once when
+        a service registers or unregisters since the discovery listener is notified.
+        """
+        now = time.time()
+        cached = self._discovery_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        self._start_discovery_listener()
+        generation = self._discovery_generation
+        value = load()
+        if generation == self._discovery_generation:
+            self._discovery_cache[key] = (now + self.SERVICE_HEARTBEAT_INTERVAL, value)
+        return value
+
+    def invalidate_discovery_cache(self, service_name=None):
+        self._discovery_generation += 1
+        if service_name is None:
+            self._discovery_cache.clear()
+            return
+
+        self._discovery_cache.pop(("service_list",), None)
+        self._discovery_cache.pop(("service_data", service_name), None)
+        self._discovery_cache.pop(("alive_service_uuid_set", service_name), None)
+
     def get_service_uuid_set_key(self, service_name):
         return ".".join(
             [
@@ -94,8 +212,11 @@ class RPCManager(object):
         )
 
     def get_service_uuid_set(self, service_name):
-        service_uuid_set_key = self.get_service_uuid_set_key(service_name)
-        service_uuid_set = Set(service_uuid_set_key, packer=self._data_packer, url=self._redis_url)
+        service_uuid_set = self._service_uuid_sets.get(service_name)
+        if service_uuid_set is None:
+            service_uuid_set_key = self.get_service_uuid_set_key(service_name)
+            service_uuid_set = Set(service_uuid_set_key, packer=self._data_packer, url=self._redis_url)
+            self._service_uuid_sets[service_name] = service_uuid_set
         return service_uuid_set
 
     def get_service_instance_key(self, service_name, service_uuid):
@@ -108,8 +229,16 @@ class RPCManager(object):
         )
 
     def get_service_instance(self, service_name, service_uuid):
-        service_instance_key = self.get_service_instance_key(service_name, service_uuid)
-        return Dict(service_instance_key)
+        service_instance = self._service_instances.get((service_name, service_uuid))
+        if service_instance is None:
+            service_instance_key = self.get_service_instance_key(service_name, service_uuid)
+            service_instance = Dict(service_instance_key, packer=self._data_packer, url=self._redis_url)
+            self._service_instances[(service_name, service_uuid)] = service_instance
+        return service_instance
+
+    def _clear_service_instance(self, service_name, service_uuid):
+        self.get_service_instance(service_name, service_uuid).clear()
+        self._service_instances.pop((service_name, service_uuid), None)
 
     def get_service_instance_mailbox_channel(self, service_name, service_uuid):
         return ".".join(
@@ -120,6 +249,25 @@ class RPCManager(object):
             ]
         )
 
+    def get_service_request_stream_key(self, service_name):
+        return ".".join(
+            [
+                self.group_key,
+                "service[{service_name}]".format(service_name=service_name),
+                "request_stream"
+            ]
+        )
+
+    def get_service_request_stream(self, service_name, service_uuid=None):
+        return Stream(
+            self.get_service_request_stream_key(service_name),
+            service_name,
+            consumer_name=service_uuid,
+            max_len=self.REQUEST_STREAM_MAX_LENGTH,
+            packer=self._data_packer,
+            url=self._redis_url
+        )
+
     def get_client_mailbox_channel(self, service_name, service_uuid, client_uuid):
         return ".".join(
             [
@@ -130,17 +278,19 @@ class RPCManager(object):
             ]
         )
 
-    def register_service(self, service_name, method_list, enable_multi_instance=True):
+    def register_service(self, service_name, method_list, enable_multi_instance=True, transport=TRANSPORT_PUBSUB):
         service_uuid = self.gen_service_uuid()
 
         service_data = self._service_dict.get(service_name)
         service_uuid_set = self.get_service_uuid_set(service_name)
 
-        if service_data and self.get_alive_service_uuid_set(service_name):
+        if service_data and self._get_alive_service_uuid_set(service_name):
             if not enable_multi_instance or not service_data["enable_multi_instance"]:
                 raise TypeError("service instance already exist.")
             if method_list != service_data["method_list"]:
                 raise TypeError("can not register same service with different methods.")
+            if transport != service_data.get("transport", TRANSPORT_PUBSUB):
+                raise TypeError("can not register same service with different transports.")
 
             service_data["last_register_time"] = self.time
         else:
@@ -149,6 +299,7 @@ class RPCManager(object):
                 "service_name": service_name,
                 "method_list": sorted(method_list),
                 "enable_multi_instance": enable_multi_instance,
+                "transport": transport,
 
                 "service_uuid_set_key": service_uuid_set_key,
 
@@ -167,31 +318,35 @@ class RPCManager(object):
             {
                 "service_name": service_name,
                 "service_uuid": service_uuid,
-                "last_heartbeat_time": self.time,
 
                 "last_call_require_time": 0.,
                 "last_call_return_time": 0.,
             }
         )
 
+        # raw values are read by ALIVE_SERVICE_INSTANCE_SCRIPT
+        service_instance.set_raw("last_heartbeat_time", self.time)
         service_instance.set_raw("total_require", 0)
         service_instance.set_raw("total_return", 0)
 
+        self._notify_discovery(service_name)
+
         return service_uuid
 
     def unregister_service(self, service_name, service_uuid):
-        service_instance = self.get_service_instance(service_name, service_uuid)
-        service_instance.clear()
+        self._clear_service_instance(service_name, service_uuid)
 
         service_uuid_set = self.get_service_uuid_set(service_name)
         service_uuid_set.discard(service_uuid)
 
-        if not self.get_alive_service_uuid_set(service_name):
+        if not self._get_alive_service_uuid_set(service_name):
             self._service_dict.pop(service_name, None)
 
+        self._notify_discovery(service_name)
+
     def service_heartbeat(self, service_name, service_uuid):
         if service_uuid not in self.get_service_uuid_set(service_name):
-            self.get_service_instance(service_name, service_uuid).clear()
+            self._clear_service_instance(service_name, service_uuid)
             return False
 
         service_instance = self.get_service_instance(service_name, service_uuid)
@@ -199,36 +354,59 @@ class RPCManager(object):
             self.get_service_uuid_set(service_name).discard(service_uuid)
             return False
 
-        service_instance["last_heartbeat_time"] = self.time
+        service_instance.set_raw("last_heartbeat_time", self.time)
         return True
 
-    def get_alive_service_uuid_set(self, service_name):
+    def _sort_alive_service_uuids(self, service_name, service_uuids):
+        """
+        remove dead service instances and sort alive ones by loss rate in one round trip.
+        :return: [service_uuid, ...] in ascending loss rate
+        """
+        if not service_uuids:
+            return []
+
         service_uuid_set = self.get_service_uuid_set(service_name)
-        deads = list(
-            filter(
-                lambda x: not self.check_service_instance_alive(service_name, x),
-                service_uuid_set
-            )
+        service_instances = [self.get_service_instance(service_name, x) for x in service_uuids]
+        packer = service_instances[0]
+
+        alive = self._alive_service_instance_script(
+            keys=[service_uuid_set.key] + [x.key for x in service_instances],
+            args=[
+                     self.time,
+                     self.SERVICE_TTL,
+                     packer.pack("last_heartbeat_time"),
+                     packer.pack("total_return"),
+                     packer.pack("total_require"),
+                 ] + [service_uuid_set.pack(x) for x in service_uuids]
         )
-        if deads:
-            service_uuid_set.difference_update(deads)
-            for service_uuid in deads:
-                service_instance = self.get_service_instance(service_name, service_uuid)
-                service_instance.clear()
+        alive = list(map(service_uuid_set.unpack, alive))
 
-        return service_uuid_set
+        for service_uuid in set(service_uuids).difference(alive):
+            self._service_instances.pop((service_name, service_uuid), None)
+
+        return alive
+
+    def _get_alive_service_uuid_set(self, service_name):
+        service_uuids = list(self.get_service_uuid_set(service_name).data)
+        return frozenset(self._sort_alive_service_uuids(service_name, service_uuids))
+
+    def get_alive_service_uuid_set(self, service_name):
+        return self._get_discovery_cache(
+            ("alive_service_uuid_set", service_name),
+            lambda: self._get_alive_service_uuid_set(service_name)
+        )
 
     def check_service_instance_alive(self, service_name, service_uuid):
         service_instance = self.get_service_instance(service_name, service_uuid)
         if not service_instance.exists:
             return False
 
-        return self.time - service_instance.get("last_heartbeat_time", 0) < self.SERVICE_TTL
+        return self.time - float(service_instance.get_raw("last_heartbeat_time") or 0) < self.SERVICE_TTL
 
     def check_service_instance_loss_rate(self, service_name, service_uuid):
         service_instance = self.get_service_instance(service_name, service_uuid)
         if not service_instance.exists or \
-                self.time - service_instance.get("last_heartbeat_time", 0) > self.SERVICE_TTL:
+                self.time - float(service_instance.get_raw("last_heartbeat_time") or 0) > self.SERVICE_TTL:
             return 1.1
 
         total_return = max(1., float(service_instance.get_raw("total_return")))
@@ -237,16 +415,25 @@ class RPCManager(object):
         return 1 - total_return / total_require
 
     def get_service_list(self):
-        return list(filter(self.get_alive_service_uuid_set, self._service_dict.keys()))
+        return self._get_discovery_cache(
+            ("service_list",),
+            lambda: list(filter(self.get_alive_service_uuid_set, self._service_dict.keys()))
+        )
 
-    def get_alive_service_uuid_low_loss(self, service_name):
-        service_uuid_set = self.get_alive_service_uuid_set(service_name)
-        service_uuid_set = sorted(
-            service_uuid_set,
-            key=lambda x: self.check_service_instance_loss_rate(service_name, x)
+    def get_service_data(self, service_name):
+        return self._get_discovery_cache(
+            ("service_data", service_name),
+            lambda: self._service_dict.get(service_name, {})
         )
-        if service_uuid_set:
-            return service_uuid_set[0]
+
+    def get_alive_service_uuid_low_loss(self, service_name):
+        alive_service_uuids = self.get_alive_service_uuid_set(service_name)
+        service_uuids = self._sort_alive_service_uuids(service_name, list(alive_service_uuids))
+        if len(service_uuids) != len(alive_service_uuids):
+            self.invalidate_discovery_cache(service_name)
+
+        if service_uuids:
+            return service_uuids[0]
         else:
             return None
 
@@ -259,20 +446,33 @@ class RPCManager(object):
 
     def get_method_list(self, service_name):
         if self.get_alive_service_uuid_set(service_name):
-            return self._service_dict.get(service_name, {}).get("method_list", [])
+            return self.get_service_data(service_name).get("method_list", [])
         else:
             return []
 
-    def increase_total_request(self, service_name, service_uuid):
+    def get_transport(self, service_name):
+        return self.get_service_data(service_name).get("transport", TRANSPORT_PUBSUB)
+
+    def increase_total_request(self, service_name, service_uuid, count=1):
         service_instance = self.get_service_instance(service_name, service_uuid)
         if service_instance.exists:
-            service_instance.increase_by("total_require", 1)
+            service_instance.increase_by("total_require", count)
+
+    async def async_increase_total_request(self, service_name, service_uuid):
+        service_instance = self.get_service_instance(service_name, service_uuid)
+        if await service_instance.async_exists():
+            await service_instance.async_increase_by("total_require", 1)
 
     def increase_total_return(self, service_name, service_uuid):
         service_instance = self.get_service_instance(service_name, service_uuid)
         if service_instance.exists:
             service_instance.increase_by("total_return", 1)
 
+    async def async_increase_total_return(self, service_name, service_uuid):
+        service_instance = self.get_service_instance(service_name, service_uuid)
+        if await service_instance.async_exists():
+            await service_instance.async_increase_by("total_return", 1)
+
 
 class DefaultRPCManager(RPCManager, Singleton):
     """
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""----------------------------------------------------------------------------
+Author:
+    Huang Quanyong (wo1fSea)
+    quanyongh@foxmail.com
+Date:
+    2019/8/26
+Description:
+    test_load_balancer.py
+----------------------------------------------------------------------------"""
+
+import unittest
+from pyeasyrpc.load_balancer import LOAD_BALANCERS
+from pyeasyrpc.load_balancer import get_load_balancer
+from pyeasyrpc.load_balancer import LeastOutstandingLoadBalancer
+from pyeasyrpc.load_balancer import PowerOfTwoChoicesLoadBalancer
+
+
+class LoadBalancerTestCase(unittest.TestCase):
+
+    def test_select(self):
+        service_uuids = frozenset(["uuid0", "uuid1", "uuid2"])
+        for name in LOAD_BALANCERS:
+            load_balancer = get_load_balancer(name)
+            self.assertIs(get_load_balancer(load_balancer), load_balancer)
+            selected = set(load_balancer.select(service_uuids) for _ in range(100))
+            self.assertTrue(selected.issubset(service_uuids))
+            self.assertEqual(load_balancer.select(frozenset(["uuid0"])), "uuid0")
+
+        load_balancer = get_load_balancer("round_robin")
+        self.assertEqual(set(load_balancer.select(service_uuids) for _ in range(3)), service_uuids)
+
+        with self.assertRaises(ValueError):
+            get_load_balancer("unknown")
+
+    def test_outstanding(self):
+        load_balancer = LeastOutstandingLoadBalancer()
+        load_balancer.begin("uuid0")
+        load_balancer.begin("uuid0")
+        load_balancer.begin("uuid1")
+        self.assertEqual(load_balancer.get_outstanding("uuid0"), 2)
+        self.assertEqual(load_balancer.select(frozenset(["uuid0", "uuid1", "uuid2"])), "uuid2")
+        self.assertEqual(load_balancer.select(frozenset(["uuid0", "uuid1"])), "uuid1")
+
+        load_balancer.end("uuid0")
+        load_balancer.end("uuid0")
+        self.assertEqual(load_balancer.get_outstanding("uuid0"), 0)
+        self.assertEqual(load_balancer.select(frozenset(["uuid0", "uuid1"])), "uuid0")
+
+        load_balancer = PowerOfTwoChoicesLoadBalancer()
+        load_balancer.begin("uuid0")
+        self.assertEqual(load_balancer.select(frozenset(["uuid0", "uuid1"])), "uuid1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,9 @@ class RedisMailboxTestCase(unittest.TestCase):
         mb_send.set_message(1)
         self.assertTrue(mb_receive.get_message(), 1)
 
+        mb_send.set_messages([1, 2, 3])
+        self.assertEqual([mb_receive.get_message(1) for _ in range(3)], [1, 2, 3])
+
         msg_data = {
             "int": 1,
             "float": 2.,
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""----------------------------------------------------------------------------
+Author:
+    Huang Quanyong (wo1fSea)
+    quanyongh@foxmail.com
+Date:
+    2019/8/20
+Description:
+    test_stream.py
+----------------------------------------------------------------------------"""
+
+import unittest
+import time
+from pyeasyrpc.redis_collections.stream import Stream
+from pyeasyrpc.redis_collections.redis_object import MsgPacker, PicklePacker
+
+
+class RedisStreamTestCase(unittest.TestCase):
+
+    def test_stream_msg_packer(self):
+        self.__test_stream("test_stream_msg_pack", MsgPacker)
+
+    def test_stream_pickle_packer(self):
+        self.__test_stream("test_stream_pickle_pack", PicklePacker)
+
+    def __test_stream(self, redis_key, packer):
+        producer = Stream(redis_key, "test_group", packer=packer)
+        producer.clear()
+
+        consumer0 = Stream(redis_key, "test_group", consumer_name="consumer0", packer=packer)
+        consumer1 = Stream(redis_key, "test_group", consumer_name="consumer1", packer=packer)
+        consumer0.create_group()
+        consumer1.create_group()
+
+        self.assertEqual(consumer0.read_group(), [])
+
+        for i in range(10):
+            producer.add(i)
+        producer.add_many(list(range(10, 20)))
+        self.assertEqual(len(producer), 20)
+
+        entries0 = consumer0.read_group(count=5)
+        entries1 = consumer1.read_group(count=100)
+        self.assertEqual([item for _, item in entries0], list(range(5)))
+        self.assertEqual([item for _, item in entries1], list(range(5, 20)))
+        self.assertEqual(consumer0.read_group(block=10), [])
+
+        consumer1.ack(*[entry_id for entry_id, _ in entries1])
+
+        # consumer0 is dead, its pending entries are claimed by consumer1
+        time.sleep(0.1)
+        claimed = consumer1.claim_stale(50)
+        self.assertEqual([item for _, item in claimed], list(range(5)))
+        self.assertEqual(consumer1.claim_stale(50000), [])
+
+        producer.clear()
+        self.assertEqual(len(producer), 0)
@@ -157,3 +157,58 @@ class RPCManagerTestCase(unittest.TestCase):
         self.rpc_manager.get_service_uuid_set(self.service_name0).discard(service_uuid)
         self.assertFalse(self.rpc_manager.service_heartbeat(self.service_name0, service_uuid))
 
+    def test_low_loss_service_uuid(self):
+        service_uuid0 = self.rpc_manager.register_service(
+            **self.service_data0
+        )
+        service_uuid1 = self.rpc_manager.register_service(
+            **self.service_data0
+        )
+
+        self.rpc_manager.increase_total_request(self.service_name0, service_uuid0, 10)
+        self.assertEqual(self.rpc_manager.get_alive_service_uuid_low_loss(self.service_name0), service_uuid1)
+
+        self.rpc_manager.increase_total_request(self.service_name0, service_uuid1, 20)
+        self.assertEqual(self.rpc_manager.get_alive_service_uuid_low_loss(self.service_name0), service_uuid0)
+
+        # dead service instance is removed by the script
+        self.rpc_manager.get_service_instance(self.service_name0, service_uuid0).set_raw("last_heartbeat_time", 0)
+        self.assertEqual(self.rpc_manager.get_alive_service_uuid_low_loss(self.service_name0), service_uuid1)
+        self.assertEqual(set(self.rpc_manager.get_service_uuid_set(self.service_name0)), {service_uuid1})
+        self.assertFalse(self.rpc_manager.get_service_instance(self.service_name0, service_uuid0).exists)
+
+        self.rpc_manager.unregister_service(self.service_name0, service_uuid1)
+        self.assertIsNone(self.rpc_manager.get_alive_service_uuid_low_loss(self.service_name0))
+
+    def test_discovery_cache(self):
+        service_uuid = self.rpc_manager.register_service(
+            **self.service_data0
+        )
+
+        rpc_manager1 = RPCManager()
+        # cache never expires by ttl, only by notification
+        rpc_manager1.SERVICE_HEARTBEAT_INTERVAL = 60
+
+        self.assertEqual(rpc_manager1.get_alive_service_uuid_set(self.service_name0), {service_uuid})
+        self.assertIs(
+            rpc_manager1.get_alive_service_uuid_set(self.service_name0),
+            rpc_manager1.get_alive_service_uuid_set(self.service_name0)
+        )
+        self.assertIs(
+            rpc_manager1.get_service_instance(self.service_name0, service_uuid),
+            rpc_manager1.get_service_instance(self.service_name0, service_uuid)
+        )
+
+        service_uuid1 = self.rpc_manager.register_service(
+            **self.service_data0
+        )
+        time.sleep(0.1)
+        self.assertEqual(rpc_manager1.get_alive_service_uuid_set(self.service_name0), {service_uuid, service_uuid1})
+
+        self.rpc_manager.unregister_service(self.service_name0, service_uuid)
+        self.rpc_manager.unregister_service(self.service_name0, service_uuid1)
+        time.sleep(0.1)
+        self.assertFalse(rpc_manager1.get_alive_service_uuid_set(self.service_name0))
+        self.assertSequenceEqual([], rpc_manager1.get_service_list())
+
+        rpc_manager1.stop_discovery_listener()
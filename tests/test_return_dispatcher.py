@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""----------------------------------------------------------------------------
+Author:
+    Huang Quanyong (wo1fSea)
+    quanyongh@foxmail.com
+Date:
+    2019/8/24
+Description:
+    test_return_dispatcher.py
+----------------------------------------------------------------------------"""
+
+import unittest
+from pyeasyrpc.rpc_manager import RPCManager
+from pyeasyrpc.redis_collections.mailbox import Mailbox
+from pyeasyrpc.return_dispatcher import ReturnDispatcher
+
+
+class ReturnDispatcherTestCase(unittest.TestCase):
+
+    def test_dispatch(self):
+        rpc_manager = RPCManager()
+        channel = "test_return_dispatcher"
+        mb_send = Mailbox(channel)
+
+        dispatcher = ReturnDispatcher(Mailbox(channel), rpc_manager)
+        dispatcher.EXPIRE_CHECK_INTERVAL = 0.1
+
+        now = rpc_manager.time
+        future0 = dispatcher.register("rpc_uuid0", now + 10)
+        future1 = dispatcher.register("rpc_uuid1", now + 10)
+        future2 = dispatcher.register("rpc_uuid2", now + 0.1)
+        self.assertTrue(dispatcher.is_running)
+
+        mb_send.set_message({"rpc_uuid": "rpc_uuid1", "return_value": 1})
+        mb_send.set_message({"rpc_uuid": "unknown", "return_value": 2})
+        mb_send.set_message({"rpc_uuid": "rpc_uuid0", "return_value": 0})
+
+        self.assertEqual(future0.result(1)["return_value"], 0)
+        self.assertEqual(future1.result(1)["return_value"], 1)
+        self.assertIs(dispatcher.get_future("rpc_uuid0"), future0)
+        dispatcher.discard("rpc_uuid0")
+        self.assertIsNone(dispatcher.get_future("rpc_uuid0"))
+
+        # expired calls are removed
+        self.assertIsNone(future2.result(1))
+        self.assertIsNone(dispatcher.get_future("rpc_uuid2"))
+        self.assertEqual(len(dispatcher), 1)
+
+        dispatcher.stop()
+        self.assertFalse(dispatcher.is_running)
@@ -9,13 +9,20 @@ Description:
     test_rpc.py
 ----------------------------------------------------------------------------"""
 
+import os
 import unittest
+import time
+import threading
 import asyncio
 
 from pyeasyrpc.rpc import remote_method
 from pyeasyrpc.rpc import RPCService
 from pyeasyrpc.rpc import RPCClient
 from pyeasyrpc.rpc import AsyncRPCClient
+from pyeasyrpc.rpc import AsyncRPCService
+from pyeasyrpc.rpc import RPCServiceBusyError
+from pyeasyrpc.rpc_manager import DefaultRPCManager
+from pyeasyrpc.rpc_data import TRANSPORT_STREAM
 
 
 class TestInstance(RPCService):
@@ -24,6 +31,36 @@ class TestInstance(RPCService):
         return a + b
 
 
+class StreamTestInstance(TestInstance):
+    pass
+
+
+class AsyncTestInstance(AsyncRPCService):
+    @remote_method
+    def add(self, a, b):
+        return a + b
+
+    @remote_method
+    async def sleep_add(self, a, b):
+        await asyncio.sleep(0.2)
+        return a + b
+
+
+class AsyncStreamTestInstance(AsyncTestInstance):
+    pass
+
+
+class PoolTestInstance(RPCService):
+    @remote_method
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    @remote_method(cpu_bound=True)
+    def get_pid(self):
+        return os.getpid()
+
+
 class RPCTestCase(unittest.TestCase):
 
     def test_call_method(self):
@@ -101,6 +138,103 @@ class RPCTestCase(unittest.TestCase):
 
         instance0.unregister()
 
+    def test_load_balancer(self):
+        instance0 = TestInstance()
+        instance1 = TestInstance()
+
+        client0 = RPCClient("TestInstance", load_balancer="round_robin")
+        requests = [client0.set_call_method_request("add", (1, i), {}) for i in range(4)]
+        self.assertEqual(len(client0.load_balancer._outstanding), 2)
+
+        self.assertTrue(instance0.process())
+        self.assertTrue(instance0.process())
+        self.assertTrue(instance1.process())
+        self.assertTrue(instance1.process())
+
+        for i, (rpc_uuid, expire_time) in enumerate(requests):
+            self.assertEqual(client0.get_call_method_result_with_uuid(rpc_uuid, expire_time).get("return_value"), i + 1)
+        self.assertEqual(len(client0.load_balancer._outstanding), 0)
+
+        # calls are sent to the alive service instance only
+        instance1.unregister()
+        time.sleep(0.1)
+        instance0.start_background_running()
+        self.assertEqual([client0.add(1, i) for i in range(4)], [1, 2, 3, 4])
+        instance0.stop_background_running()
+
+        instance0.unregister()
+
+    def test_share_client_between_threads(self):
+        instance0 = TestInstance(process_request_in_thread=True)
+        client0 = RPCClient("TestInstance")
+        instance0.start_background_running()
+
+        results = []
+
+        def call(a):
+            for b in range(20):
+                results.append(client0.add(a, b) == a + b)
+
+        threads = [threading.Thread(target=call, args=(a,)) for a in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results, [True] * 200)
+
+        client0.close()
+        instance0.stop_background_running()
+        instance0.unregister()
+
+    def test_call_many(self):
+        instance0 = TestInstance(process_request_in_thread=True)
+        client0 = RPCClient("TestInstance")
+        instance0.start_background_running()
+
+        calls = [("add", (i, i), {}) for i in range(100)]
+        self.assertEqual(client0.call_many(calls), [i + i for i in range(100)])
+
+        with self.assertRaises(TypeError):
+            client0.call_many([("add", (1, 2), {}), ("add", (), {})])
+
+        results = client0.call_many([("add", (), {}), ("add", (1, 2), {})], return_exceptions=True)
+        self.assertIsInstance(results[0], TypeError)
+        self.assertEqual(results[1], 3)
+
+        with client0.batch() as batch:
+            batch.add(1, 2)
+            batch.add(3, 4)
+        self.assertEqual(batch.results, [3, 7])
+
+        client0.close()
+        instance0.stop_background_running()
+        instance0.unregister()
+
+    def test_call_batch(self):
+        instance0 = TestInstance(process_request_in_thread=True)
+        client0 = RPCClient("TestInstance")
+        instance0.start_background_running()
+
+        calls = [("add", (i, i), {}) for i in range(100)]
+        self.assertEqual(client0.call_batch(calls), [i + i for i in range(100)])
+
+        with self.assertRaises(TypeError):
+            client0.call_batch([("add", (1, 2), {}), ("add", (), {})])
+
+        results = client0.call_batch([("add", (), {}), ("add", (1, 2), {})], return_exceptions=True)
+        self.assertIsInstance(results[0], TypeError)
+        self.assertEqual(results[1], 3)
+
+        with client0.batch(single_request=True) as batch:
+            batch.add(1, 2)
+            batch.add(3, 4)
+        self.assertEqual(batch.results, [3, 7])
+
+        client0.close()
+        instance0.stop_background_running()
+        instance0.unregister()
+
     def test_service_process_request_in_thread(self):
         instance0 = TestInstance(process_request_in_thread=True)
 
@@ -126,6 +260,82 @@ class RPCTestCase(unittest.TestCase):
         instance0.stop_background_running()
         instance0.unregister()
 
+    def test_blocking_dispatch(self):
+        instance0 = TestInstance(blocking_dispatch=True)
+        client0 = RPCClient("TestInstance")
+
+        self.assertFalse(instance0.process(0.05))
+
+        instance0.start_background_running()
+
+        self.assertEqual(client0.add(1, 2), 3)
+        self.assertEqual(client0.add(1, 2), 3)
+
+        start_time = time.time()
+        instance0.stop_background_running()
+        self.assertLess(time.time() - start_time, instance0.BLOCKING_DISPATCH_TIMEOUT)
+
+        instance0.unregister()
+
+    def test_worker_pool(self):
+        instance0 = PoolTestInstance(
+            process_request_in_thread=True,
+            max_workers=1,
+            max_process_workers=1,
+            max_pending_requests=2
+        )
+        client0 = RPCClient("PoolTestInstance")
+
+        requests = [client0.set_call_method_request("sleep", (0.2,), {}) for _ in range(3)]
+        while instance0.process():
+            pass
+        self.assertEqual(instance0.pending_request_count, 2)
+
+        results = [client0.get_call_method_result_with_uuid(*request) for request in requests]
+        self.assertEqual([rpc_data["return_value"] for rpc_data in results[:2]], [0.2, 0.2])
+        self.assertIsInstance(results[2]["exception"], RPCServiceBusyError)
+
+        instance0.start_background_running()
+
+        self.assertNotEqual(client0.get_pid(), os.getpid())
+
+        instance0.stop_background_running()
+        instance0.unregister()
+
+    def test_stream_transport(self):
+        DefaultRPCManager().get_service_request_stream("StreamTestInstance").clear()
+
+        instance0 = StreamTestInstance(transport=TRANSPORT_STREAM)
+        instance1 = StreamTestInstance(transport=TRANSPORT_STREAM, blocking_dispatch=True)
+
+        with self.assertRaises(TypeError):
+            StreamTestInstance()
+
+        client0 = RPCClient("StreamTestInstance", instance0.service_uuid)
+        self.assertEqual(client0.transport, TRANSPORT_STREAM)
+
+        requests = [client0.set_call_method_request("add", (i, i), {}) for i in range(10)]
+
+        # requests are kept in the stream until a instance reads them
+        while instance1.process():
+            pass
+        self.assertFalse(instance0.process())
+
+        for i, (rpc_uuid, expire_time) in enumerate(requests):
+            self.assertEqual(
+                client0.get_call_method_result_with_uuid(rpc_uuid, expire_time).get("return_value"),
+                i + i
+            )
+
+        instance0.start_background_running()
+        instance1.start_background_running()
+        self.assertEqual(client0.add(1, 2), 3)
+        instance0.stop_background_running()
+        instance1.stop_background_running()
+
+        instance0.unregister()
+        instance1.unregister()
+
     def test_client_async_call_method(self):
         instance0 = TestInstance(process_request_in_thread=True)
         client = AsyncRPCClient("TestInstance")
@@ -137,19 +347,57 @@ class RPCTestCase(unittest.TestCase):
             with self.assertRaises(Exception) as context:
                 await client.add()
 
-        task = [add(), catch_exception()]
-
         async def func():
-            await asyncio.wait(task)
+            task = [add(), catch_exception()]
+            task.extend([add() for _ in range(100)])
+            await asyncio.gather(*task)
+            await client.close()
 
         instance0.start_background_running()
 
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(func())
+        asyncio.run(func())
+        # a new event loop starts a new reader
+        asyncio.run(func())
 
         instance0.stop_background_running()
         instance0.unregister()
 
+    def test_async_service(self):
+        DefaultRPCManager().get_service_request_stream("AsyncStreamTestInstance").clear()
+
+        instance0 = AsyncTestInstance(max_concurrency=100)
+        instance1 = AsyncStreamTestInstance(transport=TRANSPORT_STREAM)
+        instance0.start_background_running()
+        instance1.start_background_running()
+
+        client0 = AsyncRPCClient("AsyncTestInstance")
+        client1 = AsyncRPCClient("AsyncStreamTestInstance")
+
+        async def func(client):
+            self.assertEqual(await client.add(1, 2), 3)
+            with self.assertRaises(TypeError):
+                await client.add()
+
+            self.assertEqual(
+                await client.async_call_batch([("sleep_add", (1, 2), {}), ("add", (3, 4), {})]),
+                [3, 7]
+            )
+
+            start_time = time.time()
+            results = await asyncio.gather(*[client.sleep_add(i, i) for i in range(50)])
+            self.assertEqual(results, [i + i for i in range(50)])
+            self.assertLess(time.time() - start_time, 0.2 * 10)
+
+            await client.close()
+
+        asyncio.run(func(client0))
+        asyncio.run(func(client1))
+
+        instance0.stop_background_running()
+        instance1.stop_background_running()
+        instance0.unregister()
+        instance1.unregister()
+
 
 if __name__ == '__main__':
     RPCTestCase().test_run_service_in_thread()